@@ -62,7 +62,7 @@ class CodeEval:
                     language=problems[task_id]["language"],
                     completion=completion
                 )
-            samples += [result]
+            samples.append(result)
         pbar.update(num_samples_per_task)
         return batch_completions
 
@@ -151,7 +151,7 @@ class FOLEval:
             count_pass += (answer == ground_truth)
             count_compile_error += (not compiles)
             count_syn_error += (not is_parsed)
-            samples += [res]
+            samples.append(res)
             pbar.update(syncode.num_samples)
         
         if out_path is not None: write_jsonl(out_path, samples)
@@ -79,7 +79,7 @@ class JSONEval:
                     ground_truth = problem["ground_truth"], 
                     schema = problem["schema"]
                 )
-            samples += [result]
+            samples.append(result)
         pbar.update(num_samples_per_task)
         return batch_completions
     
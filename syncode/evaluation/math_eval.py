@@ -44,7 +44,7 @@ class MathEval:
                     completion=completion,
                     passed=passed,
                 )
-                samples += [res]
+                samples.append(res)
                 results[task_id].append((completion_id, res))          
             pbar.update(syncode.num_samples)
 
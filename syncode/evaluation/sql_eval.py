@@ -36,7 +36,7 @@ class SQLEval:
                     task_id=task_id,
                     completion=completion,
                 )
-                samples += [res]
+                samples.append(res)
                 f.write(completion + '\n')
                 pbar.update(syncode.num_samples)
         pbar.close()
@@ -1,4 +1,3 @@
-import time
 import syncode.larkm as lark
 from syncode.parsers.incremental_parser import IncrementalParser
 from syncode.parse_result import ParseResult, RemainderState
@@ -16,45 +15,46 @@ class GoIncrementalParser(IncrementalParser):
         """
         Returns the set of acceptable terminals at the current partial code position.
         """
-        # Stores the sequence of tokens that the parser has seen in the order  
-        interactive = self.interactive
         lexer_tokens, lexing_incomplete = self._lex_code(partial_code)
 
         # Restore the previous state of the parser
         self._restore_recent_parser_state(lexer_tokens)
         
         # Parse the tokens
-        self.time_accepts = 0
         parse_incomplete = False
+
+        interactive = self.interactive
+        parser_state = interactive.parser_state
+        feed_token = interactive.feed_token
+        store_parser_state = self._store_parser_state
+        accepts = self._accepts
+        cur_pos, num_tokens = self.cur_pos, len(lexer_tokens)
         
         try:
-            while self.cur_pos < len(lexer_tokens):
-                token = lexer_tokens[self.cur_pos]
-                self.cur_pos += 1
+            while cur_pos < num_tokens:
+                token = lexer_tokens[cur_pos]
+                cur_pos += 1
 
                 if token.type == 'EOS' and self.next_ac_terminals is not None:
                     if 'EOS' not in self.next_ac_terminals:
                         continue
 
-                self.parsed_lexer_tokens.append(token) # parser_token_seq holds all tokens
-                interactive.feed_token(token)
+                self.last_parsed_token = token
+                feed_token(token)
                 
                 # Store the current state of the parser
-                self._store_parser_state(
-                    self.cur_pos-1, 
-                    lexer_tokens,
-                    interactive.parser_state.copy(), 
-                    self._accepts(interactive)
-                    )
+                store_parser_state(cur_pos-1, parser_state.copy(), accepts(interactive))
         except lark.exceptions.UnexpectedToken as e:
             self._handle_parsing_error(lexer_tokens, token)
             parse_incomplete = True
+        finally:
+            self.cur_pos = cur_pos
                 
         # Compute current terminal string
         remainder_state, current_term_str, final_terminal = self._get_remainder(partial_code, parse_incomplete=parse_incomplete)
         
         if remainder_state != RemainderState.INCOMPLETE:
-            self.next_ac_terminals.add('EOS')
+            self.next_ac_terminals = self.next_ac_terminals | {'EOS'}
 
         return ParseResult.from_accept_terminals(self.cur_ac_terminals, self.next_ac_terminals, current_term_str, remainder_state, final_terminal=final_terminal, ignore_terminals=self.base_parser.lexer_conf.ignore)
     
\ No newline at end of file
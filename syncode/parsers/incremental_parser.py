@@ -1,15 +1,52 @@
-import copy
+import re
+from collections import OrderedDict
 import syncode.common as common
 import syncode.larkm as lark
 from syncode.larkm.parsers.lalr_interactive_parser import InteractiveParser
+from syncode.larkm.parsers.lalr_parser_state import ParserState
 from syncode.parse_result import ParseResult, RemainderState
-from syncode.larkm.lexer import Token
+from syncode.larkm.lexer import Token, _regexp_has_newline
 from typing import Optional, Any, Tuple, Iterable
 
+_NON_SPACE_RE = re.compile(r'[^ ]')
+
+# Matches terminal patterns that only repeat a single character class, e.g., '(?:[ \t\f\r\n])+' for whitespace
+_CHAR_CLASS_REPEAT_RE = re.compile(r'(\(\?:)?\[[^\[\]]*\](?(1)\))[*+]')
+
+
+class FastParserState(ParserState):
+    """
+    Parser state that copies the value stack shallowly. The incremental parser only relies on the state stack to compute the acceptable terminals, so the values (tokens and partial trees) are shared between the copies instead of being deepcopied.
+    """
+    __slots__ = ()
+
+    def __copy__(self):
+        return type(self)(
+            self.parse_conf,
+            self.lexer,
+            list(self.state_stack),
+            list(self.value_stack),
+        )
+
+
+class FastInteractiveParser(InteractiveParser):
+    """
+    Interactive parser that uses FastParserState so that copying the parser (e.g., in accepts()) is cheap.
+    """
+    @classmethod
+    def from_interactive(cls, interactive: InteractiveParser) -> 'FastInteractiveParser':
+        ps = interactive.parser_state
+        parser_state = FastParserState(ps.parse_conf, ps.lexer, ps.state_stack, ps.value_stack)
+        return cls(interactive.parser, parser_state, interactive.lexer_thread)
+
+
 class IncrementalParser:    
     """
     This is the base class for all incremental parsers.
     """
+    # Maximum number of parser states that are stored for restoring, and of cached accept sets. Least recently used entries are evicted first.
+    MAX_STORED_STATES = 256
+
     def __init__(self, base_parser, logger: Optional[common.Logger]=None, ignore_whitespace=False) -> None:
         self.cur_pos = 0 # Current cursor position in the lexer tokens list
         self.lexer_pos = 0 # Current lexer position in the code
@@ -20,141 +57,218 @@ class IncrementalParser:
         self.base_parser = base_parser
 
         self.logger = logger if logger is not None else common.EmptyLogger()
-        self.interactive = self.base_parser.parse_interactive('')
-        self.parsed_lexer_tokens: list = []
+        self.interactive = self._get_interactive_parser()
+        self.last_parsed_token: Optional[Token] = None # Last lexer token fed to the parser
+
+        # last_parsed_token, parser_state, cur_ac_terminals, next_ac_terminals, indent_levels (optional), dedent_queue
+        self.cur_pos_to_parser_state: OrderedDict[int, Tuple[Any, frozenset, frozenset, Optional[list], list]] = OrderedDict()
 
-        # parser_state, cur_ac_terminals, next_ac_terminals, indent_levels (optional), dedent_queue
-        self.cur_pos_to_parser_state: dict[int, Tuple[Any, set, set, Optional[list], list]] = {}
+        # prefix_hashes[i] is the hash of the lexer tokens till position i in the current call
+        self.prefix_hashes: list[int] = []
+
+        # Code lexed in the previous call and its lexer tokens, used to lex only the changed suffix
+        self._lexed_code: str = ''
+        self._lexed_tokens: list = []
+        self._can_reuse_lexed_tokens: bool = self._lexed_tokens_reusable()
+
+        # Maps the parser state stack to the set of acceptable terminals
+        self._accepts_cache: OrderedDict[tuple, frozenset] = OrderedDict()
+
+        # Accept sets are interned so that equal sets share a single immutable instance
+        self._accepts_intern: dict[frozenset, frozenset] = {}
          
-        self.cur_ac_terminals: set = set()
-        self.next_ac_terminals: set = self._accepts(self.interactive)
+        self.cur_ac_terminals: frozenset = frozenset()
+        self.next_ac_terminals: frozenset = self._accepts(self.interactive)
 
     def reset(self):
         """
         Resets the parser to the initial state.
         """
-        self.cur_pos_to_parser_state = {}
+        self.cur_pos_to_parser_state = OrderedDict()
+        self._accepts_cache = OrderedDict()
+        self.prefix_hashes = []
         self.lexer_pos = 0
 
         # Reset the parser state
         self._set_initial_parser_state()
 
+    def _get_interactive_parser(self) -> FastInteractiveParser:
+        return FastInteractiveParser.from_interactive(self.base_parser.parse_interactive(''))
+
     def _set_initial_parser_state(self):
         self.cur_pos = 0
         self.dedent_queue = []
-        self.parsed_lexer_tokens = []
-        self.interactive = self.base_parser.parse_interactive('')
-        self.cur_ac_terminals = set()
+        self.last_parsed_token = None
+        self.interactive = self._get_interactive_parser()
+        self.cur_ac_terminals = frozenset()
         self.next_ac_terminals = self._accepts(self.interactive)
     
-    def _store_parser_state(self, pos: int, lexer_tokens: Iterable[Token], parser_state, accepts: set, indent_levels: Optional[list] = None):  
+    def _store_parser_state(self, pos: int, parser_state, accepts: frozenset, indent_levels: Optional[list] = None):  
         cur_ac_terminals = self.next_ac_terminals  
         next_ac_terminals = accepts 
         
-        # Create a hash of lexer tokens till position pos
-        key = self._get_hash(lexer_tokens[:pos+1])
+        # Hash of lexer tokens till position pos
+        key = self.prefix_hashes[pos]
 
-        # parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, dedent_queue
-        self.cur_pos_to_parser_state[key] = (copy.deepcopy(self.parsed_lexer_tokens), parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, copy.deepcopy(self.dedent_queue))
+        # last_parsed_token, parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, dedent_queue
+        self.cur_pos_to_parser_state[key] = (self.last_parsed_token, parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, list(self.dedent_queue))
+        self.cur_pos_to_parser_state.move_to_end(key)
+        if len(self.cur_pos_to_parser_state) > self.MAX_STORED_STATES:
+            self.cur_pos_to_parser_state.popitem(last=False)
         
-        self.cur_ac_terminals = copy.deepcopy(cur_ac_terminals)
-        self.next_ac_terminals = copy.deepcopy(next_ac_terminals)
+        # The accept sets are immutable, so they are shared with the stored state
+        self.cur_ac_terminals = cur_ac_terminals
+        self.next_ac_terminals = next_ac_terminals
 
     def _restore_parser_state(self, key: int):
-        parsed_lexer_tokens, parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, dedent_queue = self.cur_pos_to_parser_state[key]
+        last_parsed_token, parser_state, cur_ac_terminals, next_ac_terminals, indent_levels, dedent_queue = self.cur_pos_to_parser_state[key]
+        self.cur_pos_to_parser_state.move_to_end(key)
         
         self.interactive.parser_state = parser_state.copy()
-        self.parsed_lexer_tokens = copy.deepcopy(parsed_lexer_tokens)
-        self.dedent_queue = copy.deepcopy(dedent_queue)
-        self.cur_ac_terminals = copy.deepcopy(cur_ac_terminals)
-        self.next_ac_terminals = copy.deepcopy(next_ac_terminals)
+        self.last_parsed_token = last_parsed_token
+        self.dedent_queue = list(dedent_queue)
+        self.cur_ac_terminals = cur_ac_terminals
+        self.next_ac_terminals = next_ac_terminals
 
         if indent_levels is not None:
-            self.indent_level = copy.deepcopy(indent_levels)
+            self.indent_level = list(indent_levels)
 
 
     def _lex_code(self, code) -> Tuple[Iterable[Token], bool]:
         """
         Lexes the given code and returns the list of tokens.
         """
-        # Collect Lexer tokens
-        lexer_tokens: Iterable[Token] = []
+        # Reuse the tokens of the previously lexed code that end before the line where the code changed
+        lexer_tokens: Iterable[Token] = self._get_reusable_tokens(code)
         interactive = self.base_parser.parse_interactive(code)
         lexer_state = interactive.lexer_thread.state
+        line_ctr = lexer_state.line_ctr
+        if lexer_tokens:
+            last_token = lexer_tokens[-1]
+            line_ctr.char_pos = last_token.end_pos
+            line_ctr.line = last_token.end_line
+            line_ctr.column = last_token.end_column
+            line_ctr.line_start_pos = last_token.end_pos - last_token.end_column + 1
+            lexer_state.last_token = last_token
+
+        # Collect Lexer tokens
         lexing_incomplete = False
+        next_token = interactive.lexer_thread.lexer.next_token
+        append = lexer_tokens.append
+        text_len = len(lexer_state.text)
         try:
-            while lexer_state.line_ctr.char_pos < len(lexer_state.text):
-                blexer = interactive.lexer_thread.lexer
-                token = blexer.next_token(lexer_state)
-                self.lexer_pos = lexer_state.line_ctr.char_pos
-                lexer_tokens.append(token)
+            while line_ctr.char_pos < text_len:
+                append(next_token(lexer_state))
         except lark.exceptions.UnexpectedCharacters as e:
             lexing_incomplete = True
-            # We update the lexer position to the current position since the lexer has stopped at this position
-            self.lexer_pos = lexer_state.line_ctr.char_pos
         except EOFError as e:
             pass
-    
+
+        if lexing_incomplete:
+            # We update the lexer position to the current position since the lexer has stopped at this position
+            self.lexer_pos = line_ctr.char_pos
+        else:
+            # The lexer position is at the end of the last token since trailing ignored text is not part of any token
+            self.lexer_pos = lexer_tokens[-1].end_pos if lexer_tokens else 0
+
+        self._lexed_code = code
+        self._lexed_tokens = lexer_tokens
         return lexer_tokens, lexing_incomplete
-    
+
+    def _get_reusable_tokens(self, code: str) -> list:
+        """
+        Returns the prefix of the previously lexed tokens that lexing the given code from the start would produce again.
+        A token that ends close to the change may be extended by the new text (e.g., 'de' -> 'def' or '1e' -> '1e5'), so only the tokens that end before the line containing the first changed character are reused. This relies on no token spanning from an earlier line into the changed one, so nothing is reused if the grammar has terminals that could (see _lexed_tokens_reusable).
+        """
+        if not self._can_reuse_lexed_tokens:
+            return []
+
+        prefix_len = _common_prefix_length(self._lexed_code, code)
+        line_start = code.rfind('\n', 0, prefix_len) + 1
+
+        # Tokens are ordered by position, so binary search for the first token that does not end before line_start
+        lo, hi = 0, len(self._lexed_tokens)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._lexed_tokens[mid].end_pos < line_start:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self._lexed_tokens[:lo]
+
+    def _lexed_tokens_reusable(self) -> bool:
+        """
+        Returns whether the grammar allows reusing the tokens that end before the changed line. It does not if a terminal can match text that spans lines and depends on how the text continues.
+        Such terminals make the lexer's ordered alternation depend on later lines: e.g., in C, '/* a\\n b' lexes as SLASH, STAR and NAME tokens, while appending ' */' turns the text from '/*' into a single comment token. Terminals that only repeat a character class, like whitespace, are fine. If one matches across the line in the changed code, it also matches at least up to that line in the previously lexed code, so the tokens before it were not reused.
+        """
+        return all(
+            _CHAR_CLASS_REPEAT_RE.fullmatch(t.pattern.to_regexp()) is not None
+            for t in self.base_parser.lexer_conf.terminals
+            if _regexp_has_newline(t.pattern.to_regexp())
+            )
+
     def _restore_recent_parser_state(self, lexer_tokens):
         """
         Restores the parser state to the most recent prefix matching state that was stored. 
         """
-        max_stored_index = -1
-        idx = len(lexer_tokens)-1
-        
-        while idx >= 0:
-            # TODO: This is not the best way to hash the lexer tokens. We should use a better hashing mechanism with some sliding window. 
-            key = self._get_hash(lexer_tokens[:idx+1])
-            if key in self.cur_pos_to_parser_state:
-                max_stored_index = idx
-                break
-            idx -= 1
+        prefix_hashes = self.prefix_hashes = self._get_prefix_hashes(lexer_tokens)
+        stored_states = self.cur_pos_to_parser_state
+
+        # Find the longest stored prefix. The states are keyed by prefix hash rather than position since the parser is shared by all sequences in a batch
+        max_stored_index = next((idx for idx in range(len(prefix_hashes)-1, -1, -1) if prefix_hashes[idx] in stored_states), -1)
 
         if max_stored_index != -1:
             self.cur_pos = max_stored_index + 1
-            key = self._get_hash(lexer_tokens[:max_stored_index+1])
-            self._restore_parser_state(key)
+            self._restore_parser_state(self.prefix_hashes[max_stored_index])
         else:
             self._set_initial_parser_state()
 
-    def _get_hash(self, lexer_tokens: Iterable[Token]) -> int:
-        return hash(tuple(lexer_tokens))
+    def _get_prefix_hashes(self, lexer_tokens: Iterable[Token]) -> list[int]:
+        """
+        Returns the hashes of all prefixes of the lexer tokens. Each hash is chained from the previous one, so computing all of them is linear in the number of tokens.
+        """
+        prefix_hashes = []
+        h = 0
+        for token in lexer_tokens:
+            h = hash((h, token.type, token.value))
+            prefix_hashes.append(h)
+        return prefix_hashes
 
     def get_acceptable_next_terminals(self, partial_code) -> ParseResult:
         """
         Returns the set of acceptable terminals at the current partial code position.
         """
-        # Stores the sequence of tokens that the parser has seen in the order  
-        interactive = self.interactive
         lexer_tokens, lexing_incomplete = self._lex_code(partial_code)
-        self.next_ac_terminals = self._accepts(interactive)
 
         # Restore the previous state of the parser
         self._restore_recent_parser_state(lexer_tokens)
 
         # Parse the tokens
-        self.time_accepts = 0
         parse_incomplete = False
+
+        # Bind the attributes used in the loop to locals. This must happen after restoring since it may replace self.interactive
+        interactive = self.interactive
+        parser_state = interactive.parser_state
+        feed_token = interactive.feed_token
+        store_parser_state = self._store_parser_state
+        accepts = self._accepts
+        cur_pos, num_tokens = self.cur_pos, len(lexer_tokens)
         
         try:
-            while self.cur_pos < len(lexer_tokens):
-                token = lexer_tokens[self.cur_pos]
-                self.cur_pos += 1
-                self.parsed_lexer_tokens.append(token) # parser_token_seq holds all tokens
-                interactive.feed_token(token)
+            while cur_pos < num_tokens:
+                token = lexer_tokens[cur_pos]
+                cur_pos += 1
+                self.last_parsed_token = token
+                feed_token(token)
 
                 # Store the current state of the parser
-                self._store_parser_state(
-                    self.cur_pos-1,
-                    lexer_tokens, 
-                    interactive.parser_state.copy(), 
-                    self._accepts(interactive))
+                store_parser_state(cur_pos-1, parser_state.copy(), accepts(interactive))
 
         except lark.exceptions.UnexpectedToken as e:
             parse_incomplete = True
             self._handle_parsing_error(lexer_tokens, token)
+        finally:
+            self.cur_pos = cur_pos
 
         # Compute current terminal string
         remainder_state, current_term_str, final_terminal = self._get_remainder(partial_code, lexing_incomplete=lexing_incomplete, parse_incomplete=parse_incomplete)            
@@ -164,39 +278,57 @@ class IncrementalParser:
     def _get_remainder(self, code, lexing_incomplete=False, parse_incomplete=False):
         final_terminal = None
         if lexing_incomplete: # Lexing is incomplete
-            current_term_str = code[self.lexer_pos:]
-            
+            start = self.lexer_pos
             if self._ignore_whitespace:
-                current_term_str = current_term_str.lstrip(' ') # Remove space from the beginning
+                start = self._skip_spaces(code, start) # Remove space from the beginning
+            current_term_str = code[start:]
 
             if current_term_str == '':
                 remainder_state = RemainderState.COMPLETE
             else: 
                 remainder_state = RemainderState.INCOMPLETE
                 self.cur_ac_terminals = self.next_ac_terminals
-                self.next_ac_terminals = set()
+                self.next_ac_terminals = frozenset()
         elif parse_incomplete: # Parsing is incomplete
             remainder_state = RemainderState.INCOMPLETE
-            current_term_str = self.parsed_lexer_tokens[-1].value
-            final_terminal = self.parsed_lexer_tokens[-1].type
-        elif len(self.parsed_lexer_tokens) > 0:
+            current_term_str = self.last_parsed_token.value
+            final_terminal = self.last_parsed_token.type
+        elif self.last_parsed_token is not None:
             if self.lexer_pos < len(code): # In this case the final lexical tokens are ignored by the parser
                 remainder_state = RemainderState.COMPLETE
                 current_term_str = ''
             else:
                 # Although this is a complete terminal, it may happen that this may be just prefix of some other terminal
                 # e.g., 'de' may seem like a variable name that is complete, but it may be just a prefix of 'def'
-                current_term_str = self.parsed_lexer_tokens[-1].value
+                current_term_str = self.last_parsed_token.value
                 remainder_state = RemainderState.MAYBE_COMPLETE
-                final_terminal = self.parsed_lexer_tokens[-1].type
+                final_terminal = self.last_parsed_token.type
         else:
             # When the code is empty
             remainder_state = RemainderState.COMPLETE
             current_term_str = ''
         return remainder_state, current_term_str, final_terminal
     
-    def _accepts(self, interactive_parser: InteractiveParser) -> set:
-        accepts = interactive_parser.accepts()
+    def _skip_spaces(self, code: str, pos: int) -> int:
+        """
+        Returns the position of the first non-space character in the code at or after pos, or len(code) if there is none.
+        """
+        m = _NON_SPACE_RE.search(code, pos)
+        return m.start() if m is not None else len(code)
+
+    def _accepts(self, interactive_parser: InteractiveParser) -> frozenset:
+        # The acceptable terminals depend only on the state stack since accepts() simulates the reductions on it
+        key = tuple(interactive_parser.parser_state.state_stack)
+        accepts_cache = self._accepts_cache
+        accepts = accepts_cache.get(key)
+        if accepts is None:
+            accepts = frozenset(interactive_parser.accepts())
+            accepts = self._accepts_intern.setdefault(accepts, accepts)
+            accepts_cache[key] = accepts
+            if len(accepts_cache) > self.MAX_STORED_STATES:
+                accepts_cache.popitem(last=False)
+        else:
+            accepts_cache.move_to_end(key)
         return accepts
     
     def _handle_parsing_error(self, lexer_tokens, token):
@@ -210,4 +342,21 @@ class IncrementalParser:
         else:
             # If it is the final token that gave the error, then it is okay
             self.cur_ac_terminals = self.next_ac_terminals
-            self.next_ac_terminals = set()
+            self.next_ac_terminals = frozenset()
+
+
+def _common_prefix_length(a, b) -> int:
+    """
+    Returns the length of the longest common prefix of the two sequences. The slice comparisons run in C, and the common case where one sequence extends the other needs a single comparison.
+    """
+    lo, hi = 0, min(len(a), len(b))
+    if a[:hi] == b[:hi]:
+        return hi
+    # Binary search for the first mismatch; a[:lo] == b[:lo] and a[:hi] != b[:hi] hold throughout
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
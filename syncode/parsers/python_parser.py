@@ -20,8 +20,8 @@ class PythonIncrementalParser(IncrementalParser):
         self.tab_len = indenter.tab_len
         self.indent_level = [0] # Current indentation level
     
-    def reset(self):
-        super().reset()
+    def _set_initial_parser_state(self):
+        super()._set_initial_parser_state()
         self.indent_level = [0]
 
     def _get_indentation(self, partial_code) -> int:
@@ -33,8 +33,6 @@ class PythonIncrementalParser(IncrementalParser):
         return tab_len
 
     def get_acceptable_next_terminals(self, code) -> ParseResult:
-        # Stores the sequence of tokens that the parser has seen in the order  
-        interactive = self.interactive
         lexer_tokens = self._lex_code(code)
 
         # Restore the previous state of the parser
@@ -43,12 +41,17 @@ class PythonIncrementalParser(IncrementalParser):
         next_ac_indents = None
 
         # Parse the tokens
-        self.time_accepts = 0
+        interactive = self.interactive
+        parser_state = interactive.parser_state
+        feed_token = interactive.feed_token
+        store_parser_state = self._store_parser_state
+        accepts = self._accepts
+        cur_pos, num_tokens = self.cur_pos, len(lexer_tokens)
         
         try:
-            while self.cur_pos < len(lexer_tokens):
-                token = lexer_tokens[self.cur_pos]
-                self.cur_pos += 1
+            while cur_pos < num_tokens:
+                token = lexer_tokens[cur_pos]
+                cur_pos += 1
 
                 if token.type == '_INDENT':
                     indent = token.count(' ') + token.count('\t') * self.tab_len
@@ -57,46 +60,45 @@ class PythonIncrementalParser(IncrementalParser):
                     self.dedent_queue.append(token)
                     continue
                 else:
-                    self.parsed_lexer_tokens.append(token) # parser_token_seq holds all tokens except _INDENT and _DEDENT
+                    self.last_parsed_token = token # Tracks all tokens except _INDENT and _DEDENT
 
                     while not len(self.dedent_queue)==0: # Shoot all the dedent tokens that are in the queue
                         self.indent_level.pop()
                         dedent_token = self.dedent_queue.pop()
-                        interactive.feed_token(dedent_token)
+                        feed_token(dedent_token)
                 
-                interactive.feed_token(token)
+                feed_token(token)
 
                 # Store the current state of the parser
-                self._store_parser_state(
-                    self.cur_pos-1,
-                    lexer_tokens, 
-                    interactive.parser_state.copy(), 
-                    self._accepts(interactive),
+                store_parser_state(
+                    cur_pos-1,
+                    parser_state.copy(), 
+                    accepts(interactive),
                     indent_levels=copy.copy(self.indent_level)
                 )
         except lark.exceptions.UnexpectedToken as e:
             self._handle_parsing_error(lexer_tokens, token)
+        finally:
+            self.cur_pos = cur_pos
 
         remainder_state, final_terminal = None, None
         # Compute current terminal string
         if self.lexer_pos < len(code):
             remainder_state = RemainderState.INCOMPLETE
-            current_term_str = code[self.lexer_pos:]
-
-            current_term_str = current_term_str.lstrip(' ') # Remove space from the beginning
+            current_term_str = code[self._skip_spaces(code, self.lexer_pos):] # Remove space from the beginning
             if current_term_str == '':
                 remainder_state = RemainderState.COMPLETE
         else:
             # Although this is a complete terminal, it may happen that this may be just prefix of some other terminal
             # e.g., 'de' may seem like a variable name that is complete, but it may be just a prefix of 'def'
-            current_term_str = self.parsed_lexer_tokens[-1].value
+            current_term_str = self.last_parsed_token.value
             remainder_state = RemainderState.MAYBE_COMPLETE
-            final_terminal = self.parsed_lexer_tokens[-1].type
+            final_terminal = self.last_parsed_token.type
 
         next_ac_indents = None
         if remainder_state == RemainderState.MAYBE_COMPLETE or remainder_state == RemainderState.COMPLETE:
-            if self.parsed_lexer_tokens[-1].type == '_NL':
-                last_indent_str = self.parsed_lexer_tokens[-1].value.split('\n')[-1]
+            if self.last_parsed_token.type == '_NL':
+                last_indent_str = self.last_parsed_token.value.split('\n')[-1]
                 last_indent = last_indent_str.count(' ') + last_indent_str.count('\t') * self.tab_len
                 next_ac_indents = [indent-last_indent for indent in self.indent_level if indent >= last_indent]
 
@@ -108,12 +110,12 @@ class PythonIncrementalParser(IncrementalParser):
                     next_ac_indents = IndentationConstraint(accept_indents=next_ac_indents)  
 
                 # '_NL' is always accepted in this case
-                self.cur_ac_terminals.add('_NL')
-                self.next_ac_terminals.add('_NL') 
+                self.cur_ac_terminals = self.cur_ac_terminals | {'_NL'}
+                self.next_ac_terminals = self.next_ac_terminals | {'_NL'}
 
         else: # Since current terminal is incomplete, next token should add to current terminal
             self.cur_ac_terminals = self.next_ac_terminals
-            self.next_ac_terminals = set()
+            self.next_ac_terminals = frozenset()
 
         return ParseResult.from_accept_terminals(self.cur_ac_terminals, self.next_ac_terminals, current_term_str, remainder_state, next_ac_indents=next_ac_indents, final_terminal=final_terminal, ignore_terminals=self.base_parser.lexer_conf.ignore)
 
@@ -135,19 +137,22 @@ class PythonIncrementalParser(IncrementalParser):
         # Reset the indentation level
         indenter.indent_level, indenter.paren_level = [0], 0
 
+        # PostLexConnector -> BasicLexer
+        next_token = interactive.lexer_thread.lexer.lexer.next_token
+        append = lexer_tokens.append
+        line_ctr = lexer_state.line_ctr
+        text_len = len(lexer_state.text)
+        token = None
+
         try:
-            while lexer_state.line_ctr.char_pos < len(lexer_state.text):
-                # PostLexConnector -> BasicLexer
-                blexer = interactive.lexer_thread.lexer.lexer
-                
-                token = blexer.next_token(lexer_state)
-                self.lexer_pos = lexer_state.line_ctr.char_pos
+            while line_ctr.char_pos < text_len:
+                token = next_token(lexer_state)
                 
                 # Perform postlexing indentation
                 if token.type == indenter.NL_type:
                     lexer_tokens += indenter._handle_NL(token, self.logger)
                 else:
-                    lexer_tokens.append(token)
+                    append(token)
                 if token.type in indenter.OPEN_PAREN_types:
                         indenter.paren_level += 1
                 elif token.type in indenter.CLOSE_PAREN_types:
@@ -158,6 +163,9 @@ class PythonIncrementalParser(IncrementalParser):
         except EOFError as e:
             pass
 
+        # The lexer position is at the end of the last lexed token
+        self.lexer_pos = token.end_pos if token is not None else 0
+
         return lexer_tokens
 
 
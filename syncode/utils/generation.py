@@ -2,8 +2,9 @@ from transformers import (
     PreTrainedModel,
     PreTrainedTokenizer,
 )
+import itertools
 import typing
-from typing import Iterable
+from typing import Iterable, Iterator
 BatchGenerator = typing.Callable[
     [PreTrainedModel, PreTrainedTokenizer, str, int], Iterable[str]
 ]
@@ -12,17 +13,15 @@ BatchGenerator = typing.Callable[
 def filter_code(completion: str, extra_stop_word="\n\n") -> str:
     # The program tends to overwrite, we only take the first function 
     completion = completion.lstrip("\n")
-    return completion.split(extra_stop_word)[0]
+    # Only the text before the first stop word is kept, so split at most once
+    return completion.split(extra_stop_word, 1)[0]
 
 
 def fix_indents(text: str) -> str:
     return text.replace("\t", "    ")
 
 
-def split_batch(samples: Iterable[str], size=4):
-    mini_batches = []
-
-    for i in range(0, len(samples), size):
-        mini_batches.append(samples[i : i + size])
-
-    return mini_batches
+def split_batch(samples: Iterable[str], size=4) -> Iterator[list]:
+    # Lazily yields the mini batches; wrap in list() if all of them are needed at once
+    it = iter(samples)
+    return iter(lambda: list(itertools.islice(it, size)), [])
@@ -0,0 +1,19 @@
+import unittest
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+from syncode.parsers import create_parser
+from syncode.parsers.grammars.grammar import Grammar
+
+c_grammar = Grammar('c')
+inc_parser = create_parser(c_grammar)
+
+class TestCParser(unittest.TestCase):
+    def test_incremental_lexer(self):
+        # The unterminated comment spans lines and becomes a single token once it is closed
+        inc_parser.reset()
+        partial_code = 'int main() {\n  int x = 1 /* a\n b'
+        inc_parser._lex_code(partial_code)
+        out, _ = inc_parser._lex_code(partial_code + ' */')
+        self.assertEqual(out[-1].value, '/* a\n b */')
+        self.assertEqual(out[-2].value, '1')
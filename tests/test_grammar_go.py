@@ -34,6 +34,15 @@ func main() {{
         out, _ = inc_parser._lex_code(partial_code)
         self.assertEqual(out[-1].type, 'EQUAL')
 
+    def test_incremental_lexer(self):
+        inc_parser.reset()
+        partial_code = 'package main\nfunc main() {\n  x := 1e+'
+        inc_parser._lex_code(partial_code)
+        out, _ = inc_parser._lex_code(partial_code + '5')
+        self.assertEqual(out[-1].type, 'FLOAT_LIT')
+        self.assertEqual(out[-1].value, '1e+5')
+        self.assertEqual(out[-2].value, ':=')
+
     def test_interactive_parser(self):
         inc_parser.reset()
         partial_code = '''package main
@@ -25,4 +25,12 @@ class TestJSONParser(unittest.TestCase):
         r = inc_parser.get_acceptable_next_terminals(partial_code)
         assert r.remainder == ''
         assert r.remainder_state == RemainderState.COMPLETE
-        
\ No newline at end of file
+
+    def test_json_parser_restart(self):
+        # Tests that the tokens are fed to the new interactive parser when no stored prefix matches
+        inc_parser.reset()
+        inc_parser.get_acceptable_next_terminals('{"a": ')
+        inc_parser.get_acceptable_next_terminals('{"a": 1')
+        r = inc_parser.get_acceptable_next_terminals('[1, 2] ')
+        assert AcceptSequence(['$END']) in r.accept_sequences
+        assert AcceptSequence(['RBRACE']) not in r.accept_sequences
@@ -114,6 +114,14 @@ def foo():
         r = inc_parser.get_acceptable_next_terminals(partial_code)
         self.assertEqual(r.next_ac_indents.accept_indents, [0, 4, 8])
 
+    def test_parser_restart_after_evicted_states(self):
+        # The long code stores more than MAX_STORED_STATES states, so the short prefix is parsed from scratch
+        inc_parser.reset()
+        partial_code = 'import os\n' + ''.join(f'def f{i}(a):\n    x = a + {i}\n' for i in range(40)) + '    y = 1'
+        inc_parser.get_acceptable_next_terminals(partial_code)
+        r = inc_parser.get_acceptable_next_terminals('import os\n')
+        self.assertEqual(r.next_ac_indents.accept_indents, [0])
+
     def test_parser7(self):
         inc_parser.reset()
         partial_code = 'from typing import List\n\n\ndef has_close_elements(numbers: List[float], threshold: float) -> bool:\n\tfor i in range(len(numbers) -1, -1, -1) :\n\t\tif numbers[i] - numbers[i+1] < threshold:\n\t\t\treturn True\n\treturn False\n'